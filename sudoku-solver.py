@@ -1,7 +1,11 @@
-from collections import deque
 from flask import Flask, render_template_string, request
-from sudoku_constraints4x4 import constraints4x4
-from sudoku_constraints9x9 import constraints9x9
+from sudoku_constraints import cell_name, sudoku_constraints
+# The solver itself lives in sudoku_csp, and its dict-based functions stay importable from here
+from sudoku_csp import AC3, backtracking_search, get_neighbors, minimum_remaining_values, revise
+from sudoku_dlx import dlx_search
+from sudoku_parallel import portfolio_search
+from sudoku_sat import sat_search
+from functools import partial
 import json
 
 app = Flask(__name__)
@@ -96,154 +100,18 @@ puzzle_4x4_blank = [
 
 puzzles = [puzzle_1, puzzle_2, puzzle_3, puzzle_4, puzzle_5, puzzle_9x9_blank, puzzle_4x4, puzzle_4x4_blank]
 
-# PART 2
+# SOLVERS
 
-def revise(csp, Xi, Xj):
-    """ Removes values from Xi's domain that don't satisfy constraints with anything in Xj's domain. """
-    variables, constraints = csp
+# The longest the backtracking and portfolio searches can run for before the page gives up on it
+SOLVE_SECONDS = 30
 
-    # If revise cannot be done, return False
-    if not variables.get(Xi) or not variables.get(Xj):
-        return False
-
-    # Get the variable domains
-    Di, Dj = variables[Xi], variables[Xj]
-    revised = False
-    
-    # Check each value in Xi's domain
-    for x in Di[:]:
-        satisfies_constraint = False
-        
-        # Check if there's any satisfiable constraint for every value in Xj's domain 
-        for y in Dj:
-            if [x, y] in constraints.get((Xi, Xj), []) or [x, y] in constraints.get((Xj, Xi), []):
-                satisfies_constraint = True
-                break
-                
-        # If no Dj value satisfies the constraint, remove the Di value
-        if not satisfies_constraint:
-            Di.remove(x)
-            revised = True
-
-    return revised
-
-# PART 3
-
-def get_neighbors(csp, X):
-    """ Helper function to get the cells with which cell X has a constraint. """
-    constraints = csp[1]
-
-    # Initialize neighbors as a set to ensure no duplicates and easily remove Xj in AC3
-    neighbors = set()
-
-    # If any constraint has cell X in it, add it to the set
-    for constraint in constraints.keys():
-        if constraint[0] == X:
-            neighbors.add(constraint[1])
-        elif constraint[1] == X:
-            neighbors.add(constraint[0])
-
-    return neighbors
-
-def AC3(csp):
-    """ Removes any inconsistencies across all domains in the given CSP. """
-    variables, constraints = csp
-
-    # Initialize a deque of the constraint pairs for O(1) pop and push
-    queue = deque(constraints.keys())
-
-    while queue:
-        # Pop the leftmost value and revise it
-        Xi, Xj = queue.popleft()
-
-        if revise(csp, Xi, Xj):
-            # False if there are no domains
-            if not variables[Xi]:
-                return False
-            
-            # Append each of Xi's neighbors besides Xj
-            for Xk in sorted(get_neighbors(csp, Xi) - {Xj}):
-                queue.append((Xk, Xi))
-
-    return True
-
-# PART 4
-
-def minimum_remaining_values(csp, assignments):
-    """ Among the unassigned variables, finds the one with the fewest domain values. """
-    variables = csp[0]
-    unassigned_vars = {}
-
-    # Check each variable's domains and record their lengths
-    for variable, domain in variables.items():
-        if variable not in assignments:
-            unassigned_vars[variable] = len(domain)
-    
-    # Get the variable with the minimum domain length 
-    minimum_variable = min(unassigned_vars, key = unassigned_vars.get, default = None)
-    return minimum_variable
-
-# PART 5
-
-def backtrack(assignment, csp, progress, assignments, domains, failed_values, backtracks, color_num=0):
-    """ Backtracking search to recursively find assignments for all variables in the CSP. """
-    variables, constraints = csp
-
-    # Check if the assignment is finished
-    if len(assignment) == len(variables):
-        return assignment, progress, assignments, domains, failed_values, backtracks
-
-    # Use the minimum remaining values heuristic to choose the unassigned variable
-    var = minimum_remaining_values(csp, set(assignment.keys()))
-    
-    for value in variables[var]:
-        # Create a new assignment that doesn't affect the current state
-        new_assignment = assignment.copy()
-        new_assignment[var] = value
-        
-        # Apply the assignment to the domain after deep copying
-        new_domains = {v: list(d) for v, d in variables.items()}
-        new_domains[var] = [value]
-        
-        # Create a new CSP for the new assignment
-        new_csp = (new_domains, constraints)
-
-        # Use AC-3 to keep arc consistency with the new assignment
-        if AC3(new_csp):
-            # Add the checked variable-value pair to the assignments
-            new_assignments = assignments + [var]
-
-            # If the cell hasn't been assigned, add it to the progress with the incremented color number
-            if len(variables[var]) > 1:
-                color_num += 1
-                progress.append((var, value, color_num))
-
-            result, progress, order, domains, failed, counts = backtrack(new_assignment, new_csp, progress, new_assignments, domains, failed_values, backtracks, color_num)
-            
-            # If a result is found, return it
-            if result:
-                return result, progress, order, domains, failed, counts
-        else:
-            # If this value led to failure, record it
-            failed_values[var].append(value)
-            backtracks[var] += 1
-        
-            # Store the domains for unassigned variables before backtracking
-            unassigned_domains = {v: d for v, d in new_domains.items() if v not in new_assignment}
-            domains.append(unassigned_domains)
-
-    # If no valid assignment was found for the variable, return None
-    return None, progress, assignments, domains, failed_values, backtracks
-
-def backtracking_search(csp):
-    """ Initialize places to record the data and call backtrack. """
-    # Store the counts and assignments
-    variables = csp[0]
-    failed_values = {var: [] for var in variables}
-    backtracks = {var: 0 for var in variables}
-
-    # Start backtracking with empty lists, dicts, and numbers set to 0
-    return backtrack({}, csp, [], [], [], failed_values, backtracks, 0)
+# Search functions that can be picked with the "solver" query parameter, all returning the same results
+solvers = {
+    'backtrack': partial(backtracking_search, timeout = SOLVE_SECONDS),
+    'dlx': dlx_search,
+    'sat': sat_search,
+    'portfolio': partial(portfolio_search, timeout = SOLVE_SECONDS),
+}
 
 # PART 6
 
@@ -252,12 +120,18 @@ def variables_from_puzzle(puzzle):
     variables = {}
 
     # A range from 1 through the puzzle length
-    puzzle_range = range(1, len(puzzle) + 1)
-    for i in puzzle_range:
-        for j in puzzle_range:
-            # Each variable's domain is the given value, otherwise a list of all possible values 
-            cell = puzzle[i - 1][j - 1]
-            variables[f'C{i}{j}'] = [cell] if cell else list(puzzle_range)
+    size = len(puzzle)
+    puzzle_range = range(1, size + 1)
+    for index in range(size * size):
+        # Each variable's domain is the given value, otherwise a list of all possible values 
+        cell = puzzle[index // size][index % size]
+        domain = [cell] if cell else list(puzzle_range)
+
+        # A given value that's out of range leaves the cell with no possible values
+        if cell and cell not in puzzle_range:
+            domain = []
+
+        variables[cell_name(index, size)] = domain
 
     return variables
 
@@ -277,14 +151,20 @@ def show_webpage():
             puzzle = puzzle_1
             print(f"Invalid JSON. Showing solution for puzzle_1.")
         
-    # Transform the puzzle into a valid CSP, then run backtracking search
+    # Get the solver from the URL or default to backtracking search
+    solver = request.args.get('solver', 'backtrack')
+    search = solvers.get(solver, solvers['backtrack'])
+    print(f"Solving with {solver if solver in solvers else 'backtrack'}.")
+
+    # Transform the puzzle into a valid CSP, then run the search
     size = len(puzzle)
     box_size = int(size ** 0.5)
     variables = variables_from_puzzle(puzzle)
-    constraints = constraints9x9 if size == 9 else constraints4x4
+    constraints = sudoku_constraints(size)
     csp = (variables, constraints)
 
-    solution, progress, assignments, domains, failed_values, backtracks = backtracking_search(csp)
+    stats = {}
+    solution, progress, assignments, domains, failed_values, backtracks = search(csp, stats=stats)
     
     # Log the solution and all other recorded data
     print("Solution:", solution)
@@ -293,6 +173,7 @@ def show_webpage():
     print("Domains after each assignment:", domains)
     print("Failed values for each variable:", failed_values)
     print("Number of backtracks for each variable:", backtracks)
+    print("Solve statistics:", stats)
 
     if solution:
         # Set the color of the given values to black
@@ -301,8 +182,8 @@ def show_webpage():
         # Add the color data to each cell in the puzzle
         puzzle_data = [[[puzzle[i][j], cell_colors[i][j]] for j in range(size)] for i in range(size)]
 
-        # Sort the solution values into a 1D list
-        solution_vals = list(dict(sorted(solution.items())).values())
+        # Put the solution values into a 1D list in row-major order
+        solution_vals = [solution[cell_name(index, size)] for index in range(size * size)]
 
         # Convert it into a 2D list, then add the color data to each cell
         solution_data = [solution_vals[i * size:(i + 1) * size] for i in range(size)]
@@ -701,8 +582,8 @@ def show_steps(puzzle_data, progress, solution):
         {sudoku_board(puzzle_data, 0)}
         '''
     
-    # Color each number based on the solution progression
-    def get_color(number, max_num = progress[-1][2]):
+    # Color each number based on the solution progression, which is empty if nothing had to be guessed
+    def get_color(number, max_num = progress[-1][2] if progress else 1):
         """ Adjust the color from blue towards red based on the progress number. """
         step = 255 // max_num
         red, _, blue = (0, 0, 255)
@@ -710,11 +591,15 @@ def show_steps(puzzle_data, progress, solution):
         blue = max(0, blue - step * number)
         return (red, 0, blue)
 
+    # Look up the row and column of each cell by its name
+    size = len(puzzle_data)
+    positions = {cell_name(index, size): divmod(index, size) for index in range(size * size)}
+
     # Loop through all states, each one determining the correct value of one cell 
     state = 1
     for change in progress:
         cell, value, color_num = change
-        row, col = int(cell[1]) - 1, int(cell[2]) - 1
+        row, col = positions[cell]
 
         # Calculate the rgb value and set it for the cell in the 2D list
         puzzle_data[row][col][1] = get_color(color_num)
@@ -0,0 +1,212 @@
+import importlib
+import math
+import os
+import sys
+import time
+from sudoku_constraints import sudoku_constraints
+from sudoku_constraints9x9 import constraints9x9
+from sudoku_csp import VARIABLE_ORDERS
+from sudoku_parallel import subtree_search
+
+# Compare solver configurations on the sample puzzles. Run every benchmark with "python3 sudoku_benchmark.py",
+# or pick some by name, such as "python3 sudoku_benchmark.py propagation".
+
+# The puzzles and variables_from_puzzle live in the app module, whose file name needs importlib
+solver = importlib.import_module('sudoku-solver')
+
+BENCHMARK_PUZZLES = ['puzzle_1', 'puzzle_2', 'puzzle_3', 'puzzle_4', 'puzzle_5']
+
+def run(puzzle, constraints, **options):
+    """ Solve a puzzle once, returning the seconds it took, the result, and the solve statistics. """
+    stats = {}
+    variables = solver.variables_from_puzzle(puzzle)
+    start = time.perf_counter()
+    result = solver.backtracking_search((variables, constraints), stats=stats, **options)
+    return time.perf_counter() - start, result, stats
+
+def print_table(header, rows):
+    """ Print rows of values as a table with aligned columns. """
+    rows = [header] + [[str(value) for value in row] for row in rows]
+    widths = [max(len(row[col]) for row in rows) for col in range(len(header))]
+    for row in rows:
+        print('  '.join(value.ljust(width) for value, width in zip(row, widths)))
+    print()
+
+def benchmark_propagation():
+    """ Compare AC3 with residual supports, on the generated not-equal tables and the extensional fixture. """
+    tables = {'not-equal': sudoku_constraints(9), 'extensional': constraints9x9}
+    rows = []
+    for name in BENCHMARK_PUZZLES:
+        puzzle = getattr(solver, name)
+        for table, constraints in tables.items():
+            ac3_time, ac3_result, stats = run(puzzle, constraints, propagation='ac3')
+            residual_time, residual_result, _ = run(puzzle, constraints, propagation='residual')
+            assert ac3_result[0] == residual_result[0]
+            rows.append([name, table, stats['revisions'], f'{ac3_time:.3f}', f'{residual_time:.3f}', f'{ac3_time / residual_time:.2f}x'])
+
+    print('Propagation: AC3 against residual supports')
+    print_table(['puzzle', 'table', 'revisions', 'ac3 (s)', 'residual (s)', 'speedup'], rows)
+
+def benchmark_variable_order():
+    """ Compare the variable orders: ties broken by given order or by degree, and dom/wdeg. """
+    constraints = sudoku_constraints(9)
+    rows = []
+    for name in BENCHMARK_PUZZLES:
+        puzzle = getattr(solver, name)
+        row = [name]
+        for variable_order in VARIABLE_ORDERS:
+            # Without backjumping and learning, dom/wdeg takes minutes on the hardest puzzles
+            elapsed, result, _ = run(puzzle, constraints, variable_order=variable_order, backjumping=True, learning=True)
+            row += [sum(result[5].values()), f'{elapsed:.3f}']
+        rows.append(row)
+
+    print('Variable order: backtracks and seconds, with backjumping and learning')
+    print_table(['puzzle'] + [f'{order} {column}' for order in VARIABLE_ORDERS for column in ('backtracks', '(s)')], rows)
+
+def benchmark_value_order():
+    """ Compare trying values in natural order against least constraining value first, by nodes searched. """
+    constraints = sudoku_constraints(9)
+    rows = []
+    for name in BENCHMARK_PUZZLES:
+        puzzle = getattr(solver, name)
+        natural_time, natural_result, natural = run(puzzle, constraints, value_order='natural')
+        lcv_time, lcv_result, lcv = run(puzzle, constraints, value_order='lcv')
+        assert natural_result[0] == lcv_result[0]
+        rows.append([name, natural['nodes'], lcv['nodes'], natural['nodes'] - lcv['nodes'], f'{natural_time:.3f}', f'{lcv_time:.3f}'])
+
+    print('Value order: nodes searched in natural order against least constraining value first')
+    print_table(['puzzle', 'natural nodes', 'lcv nodes', 'nodes saved', 'natural (s)', 'lcv (s)'], rows)
+
+def benchmark_backjumping():
+    """ Compare chronological backtracking against conflict-directed backjumping, by nodes searched. """
+    constraints = sudoku_constraints(9)
+    rows = []
+    for name in BENCHMARK_PUZZLES:
+        puzzle = getattr(solver, name)
+        chronological_time, chronological_result, chronological = run(puzzle, constraints)
+        backjumping_time, backjumping_result, backjumping = run(puzzle, constraints, backjumping=True)
+        assert chronological_result[0] == backjumping_result[0]
+        rows.append([name, chronological['nodes'], backjumping['nodes'], chronological['nodes'] - backjumping['nodes'],
+                     backjumping['levels_skipped'], f'{chronological_time:.3f}', f'{backjumping_time:.3f}'])
+
+    print('Backjumping: nodes searched with chronological backtracking against conflict-directed backjumping')
+    print_table(['puzzle', 'chronological nodes', 'backjumping nodes', 'nodes skipped', 'levels jumped',
+                 'chronological (s)', 'backjumping (s)'], rows)
+
+def benchmark_singles():
+    """ Compare AC3 alone against AC3 with naked and hidden singles, by the choices made with more than one value left. """
+    constraints = sudoku_constraints(9)
+    rows = []
+    for name in BENCHMARK_PUZZLES:
+        puzzle = getattr(solver, name)
+        ac3_time, ac3_result, ac3 = run(puzzle, constraints)
+        singles_time, singles_result, singles = run(puzzle, constraints, singles=True)
+        assert ac3_result[0] == singles_result[0]
+        rows.append([name, len(ac3_result[1]), len(singles_result[1]), ac3['nodes'], singles['nodes'], singles['hidden_singles'],
+                     f'{ac3_time:.3f}', f'{singles_time:.3f}'])
+
+    print('Singles: branching with AC3 alone against AC3 with naked and hidden singles')
+    print_table(['puzzle', 'ac3 choices', 'singles choices', 'ac3 nodes', 'singles nodes', 'hidden singles', 'ac3 (s)',
+                 'singles (s)'], rows)
+
+def benchmark_learning():
+    """ Compare searching with and without nogood learning, alone and on top of backjumping. """
+    constraints = sudoku_constraints(9)
+    configurations = {'plain': {}, 'learning': {'learning': True}, 'backjumping': {'backjumping': True},
+                      'backjumping + learning': {'backjumping': True, 'learning': True}}
+    rows = []
+    for name in BENCHMARK_PUZZLES:
+        puzzle = getattr(solver, name)
+        for configuration, options in configurations.items():
+            elapsed, _, stats = run(puzzle, constraints, **options)
+            rows.append([name, configuration, stats['nodes'], stats['nogoods_learned'], stats['nogood_prunes'], f'{elapsed:.3f}'])
+
+    print('Learning: nodes searched and nogoods used')
+    print_table(['puzzle', 'search', 'nodes', 'nogoods learned', 'values pruned', 'seconds'], rows)
+
+def benchmark_solvers():
+    """ Compare the backtracking search against exact cover, SAT and the portfolio on the generated not-equal tables. """
+    searches = {
+        'backtrack': solver.backtracking_search,
+        'backtrack (backjumping + learning)': lambda csp, stats: solver.backtracking_search(csp, backjumping=True, learning=True, stats=stats),
+        'dlx': solver.dlx_search,
+        'sat': solver.sat_search,
+        'portfolio': solver.portfolio_search,
+    }
+    rows = []
+    for name in BENCHMARK_PUZZLES:
+        puzzle = getattr(solver, name)
+        row = [name]
+        for search in searches.values():
+            csp = (solver.variables_from_puzzle(puzzle), sudoku_constraints(len(puzzle)))
+            start = time.perf_counter()
+            search(csp, stats={})
+            row.append(f'{time.perf_counter() - start:.3f}')
+        rows.append(row)
+
+    print('Solvers: seconds to solve')
+    print_table(['puzzle'] + list(searches), rows)
+
+def percentile(values, fraction):
+    """ Get the value that the given fraction of the values are at or below, by nearest rank. """
+    values = sorted(values)
+    return values[max(0, math.ceil(len(values) * fraction) - 1)]
+
+def benchmark_restarts(seeds=5):
+    """ Compare the solve time percentiles over the sample puzzles and several seeds, with and without restarts. """
+    constraints = sudoku_constraints(9)
+    configurations = {
+        'no seed': [{}],
+        'seeded': [{'seed': seed} for seed in range(seeds)],
+        'seeded + luby': [{'seed': seed, 'restarts': 'luby'} for seed in range(seeds)],
+        'seeded + geometric': [{'seed': seed, 'restarts': 'geometric'} for seed in range(seeds)],
+    }
+    rows = []
+    for configuration, runs in configurations.items():
+        # Learning and backjumping keep the slowest runs short enough to benchmark, and nogoods outlast restarts
+        times, restarts = [], 0
+        for name in BENCHMARK_PUZZLES:
+            for options in runs:
+                elapsed, _, stats = run(getattr(solver, name), constraints, backjumping=True, learning=True, **options)
+                times.append(elapsed)
+                restarts += stats['restarts']
+        rows.append([configuration, len(times), restarts, f'{percentile(times, 0.5):.3f}', f'{percentile(times, 0.9):.3f}',
+                     f'{percentile(times, 0.99):.3f}'])
+
+    print('Restarts: seconds to solve with backjumping and learning, over the sample puzzles and seeds')
+    print_table(['search', 'solves', 'restarts', 'p50', 'p90', 'p99'], rows)
+
+def benchmark_parallel(workers=None):
+    """ Compare the serial search against the subtree search with a worker per core, reporting the speedup. """
+    workers = workers or os.cpu_count() or 1
+    constraints = sudoku_constraints(9)
+    rows = []
+    for name in BENCHMARK_PUZZLES:
+        puzzle = getattr(solver, name)
+        serial_time, _, serial_stats = run(puzzle, constraints)
+
+        stats = {}
+        start = time.perf_counter()
+        subtree_search((solver.variables_from_puzzle(puzzle), constraints), workers=workers, stats=stats)
+        parallel_time = time.perf_counter() - start
+        rows.append([name, serial_stats['nodes'], f'{serial_time:.3f}', stats['subproblems'], stats['nodes'], f'{parallel_time:.3f}',
+                     f'{serial_time / parallel_time:.2f}x'])
+
+    print(f'Parallel: serial search against the subtree search with {workers} workers')
+    print_table(['puzzle', 'serial nodes', 'serial', 'subproblems', 'parallel nodes', 'parallel', 'speedup'], rows)
+
+BENCHMARKS = {
+    'propagation': benchmark_propagation,
+    'variable-order': benchmark_variable_order,
+    'value-order': benchmark_value_order,
+    'backjumping': benchmark_backjumping,
+    'learning': benchmark_learning,
+    'singles': benchmark_singles,
+    'restarts': benchmark_restarts,
+    'solvers': benchmark_solvers,
+    'parallel': benchmark_parallel,
+}
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
@@ -0,0 +1,192 @@
+from functools import lru_cache
+from math import isqrt
+
+# The sudoku_constraints4x4 and sudoku_constraints9x9 modules hold the same tables written out by hand.
+# They are kept as reference fixtures; the solver builds its tables here instead of importing them.
+
+# A constraint table maps each arc to the list of [x, y] pairs it allows, or to a constraint kind that
+# states the relation directly. Revising a not-equal arc only has to look at singleton domains.
+NOT_EQUAL = '!='
+
+def cell_name(index, size):
+    """ Get the variable name of a cell from its flat row-major index. """
+    # Boards past 9x9 pad the row and column to the same width, so 'C0111' and 'C1101' can't be confused
+    row, col = divmod(index, size)
+    width = len(str(size))
+    return f'C{row + 1:0{width}}{col + 1:0{width}}'
+
+@lru_cache(maxsize=None)
+def sudoku_names(size):
+    """ Get the variable names of every cell of a board, in row-major order. """
+    return tuple(cell_name(index, size) for index in range(size * size))
+
+@lru_cache(maxsize=None)
+def sudoku_units(size):
+    """ Get the rows, columns, and boxes of a board as tuples of flat cell indices. """
+    box_size = isqrt(size)
+    if box_size * box_size != size:
+        raise ValueError(f"A {size}x{size} board can't be split into square boxes.")
+
+    rows = [tuple(row * size + col for col in range(size)) for row in range(size)]
+    cols = [tuple(row * size + col for row in range(size)) for col in range(size)]
+
+    # Each box starts at a multiple of the box size in both directions
+    boxes = []
+    for top in range(0, size, box_size):
+        for left in range(0, size, box_size):
+            boxes.append(tuple((top + i) * size + left + j for i in range(box_size) for j in range(box_size)))
+
+    return tuple(rows + cols + boxes)
+
+@lru_cache(maxsize=None)
+def sudoku_cell_units(size):
+    """ Get the indices into sudoku_units of the row, column, and box each cell is in. """
+    cell_units = [[] for _ in range(size * size)]
+    for index, unit in enumerate(sudoku_units(size)):
+        for cell in unit:
+            cell_units[cell].append(index)
+
+    return tuple(map(tuple, cell_units))
+
+@lru_cache(maxsize=None)
+def sudoku_peers(size):
+    """ Get the cells sharing a row, column, or box with each cell, in index order. """
+    peers = [set() for _ in range(size * size)]
+    for unit in sudoku_units(size):
+        for cell in unit:
+            peers[cell].update(unit)
+
+    return tuple(tuple(sorted(cell_peers - {cell})) for cell, cell_peers in enumerate(peers))
+
+@lru_cache(maxsize=None)
+def sudoku_constraints(size):
+    """ Build the constraint table for a board, with the same arcs as the hand-written modules. """
+    # Each pair of peers gets one not-equal arc, keyed with the lower cell first
+    constraints = {}
+    for cell, cell_peers in enumerate(sudoku_peers(size)):
+        for peer in cell_peers:
+            if peer > cell:
+                constraints[(cell_name(cell, size), cell_name(peer, size))] = NOT_EQUAL
+
+    return constraints
+
+# Indexes compiled from a constraint table, keyed by the table's id. Each entry keeps the table alive so
+# its id can't be reused, and only the most recent tables are kept so custom CSPs don't pile up.
+MAX_CACHED_TABLES = 16
+_support_indexes = {}
+
+def cached_index(cache, constraints, build):
+    """ Get the index built from a constraint table, building it the first time the table is seen. """
+    entry = cache.get(id(constraints))
+    if entry is None or entry[0] is not constraints:
+        # Drop the oldest table once the cache is full
+        if len(cache) >= MAX_CACHED_TABLES:
+            del cache[next(iter(cache))]
+        entry = cache[id(constraints)] = (constraints, build(constraints))
+
+    return entry[1]
+
+def build_support_index(constraints):
+    """ Turn each arc's allowed pairs into a frozenset of tuples, keyed in both orientations. """
+    index = {}
+
+    # Arcs commonly share one pair list, so freeze each list only once
+    frozen = {}
+    def freeze(pairs):
+        if id(pairs) not in frozen:
+            frozen[id(pairs)] = (pairs, frozenset(map(tuple, pairs)))
+        return frozen[id(pairs)][1]
+
+    for Xi, Xj in constraints:
+        allowed = constraints[(Xi, Xj)]
+        reverse = constraints.get((Xj, Xi), allowed)
+
+        # Constraint kinds are kept as they are, but can't be combined with a list of pairs
+        if allowed is NOT_EQUAL or reverse is NOT_EQUAL:
+            if allowed is not reverse:
+                raise ValueError(f"Arcs ({Xi}, {Xj}) and ({Xj}, {Xi}) mix a constraint kind with a list of pairs.")
+            index[(Xi, Xj)] = index[(Xj, Xi)] = NOT_EQUAL
+            continue
+
+        # A pair is allowed if it's listed under either orientation of the arc
+        allowed = freeze(allowed)
+        if (Xj, Xi) in constraints:
+            allowed = allowed | freeze(reverse)
+        index[(Xi, Xj)] = index[(Xj, Xi)] = allowed
+
+    return index
+
+def support_index(constraints):
+    """ Get the cached pairs allowed by each arc of a constraint table, or the arc's constraint kind. """
+    return cached_index(_support_indexes, constraints, build_support_index)
+
+_neighbor_indexes = {}
+
+def build_neighbor_index(constraints):
+    """ Collect the cells each cell shares an arc with, as tuples sorted by name. """
+    neighbors = {}
+    for Xi, Xj in constraints:
+        neighbors.setdefault(Xi, set()).add(Xj)
+        neighbors.setdefault(Xj, set()).add(Xi)
+
+    return {X: tuple(sorted(cells)) for X, cells in neighbors.items()}
+
+def neighbor_index(constraints):
+    """ Get the cached neighbors of each cell in a constraint table. """
+    return cached_index(_neighbor_indexes, constraints, build_neighbor_index)
+
+_support_mask_indexes = {}
+
+def build_support_mask_index(constraints):
+    """ Turn each arc's allowed pairs into a bitmask of the values in Xj that support each value in Xi. """
+    index = {}
+
+    # Arcs that share a frozenset share one table of masks
+    tables = {}
+    for arc, allowed in support_index(constraints).items():
+        if allowed is NOT_EQUAL:
+            index[arc] = NOT_EQUAL
+            continue
+
+        if id(allowed) not in tables:
+            masks = {}
+            for x, y in allowed:
+                masks[x] = masks.get(x, 0) | 1 << y
+            tables[id(allowed)] = masks
+        index[arc] = tables[id(allowed)]
+
+    return index
+
+def support_mask_index(constraints):
+    """ Get the cached support bitmasks of each arc of a constraint table, or the arc's constraint kind. """
+    return cached_index(_support_mask_indexes, constraints, build_support_mask_index)
+
+_sudoku_table_sizes = {}
+
+def build_sudoku_table_size(constraints):
+    """ Get the board size if a table has exactly the arcs of a Sudoku board, each requiring different values. """
+    cells = {X for arc in constraints for X in arc}
+    size = isqrt(len(cells))
+    if size < 1 or size * size != len(cells) or isqrt(size) ** 2 != size:
+        return None
+
+    # Compare the arcs without their orientation, then check what each of them allows
+    arcs = {frozenset(arc) for arc in constraints}
+    if arcs != {frozenset(arc) for arc in sudoku_constraints(size)}:
+        return None
+
+    values = range(1, size + 1)
+    different = frozenset((x, y) for x in values for y in values if x != y)
+    supports = support_index(constraints)
+    if any(supports[arc] is not NOT_EQUAL and supports[arc] != different for arc in constraints):
+        return None
+
+    return size
+
+def sudoku_size(csp):
+    """ Get the board size of a CSP built by variables_from_puzzle over Sudoku constraints, or None if it isn't one. """
+    variables, constraints = csp
+    size = cached_index(_sudoku_table_sizes, constraints, build_sudoku_table_size)
+    if size is None or tuple(variables) != sudoku_names(size):
+        return None
+    return size
@@ -0,0 +1,967 @@
+import random
+import time
+from collections import deque
+from sudoku_constraints import cached_index, neighbor_index, sudoku_cell_units, sudoku_size, sudoku_units
+from sudoku_domains import ListDomains, domain_store
+
+# Propagation algorithms. Both run AC3's queue; 'residual' also keeps the support last found for each
+# value on each arc and checks it before searching the other domain again (residual supports, as in AC3rm).
+PROPAGATIONS = ('ac3', 'residual')
+
+# Variable orders. The first two pick the variable with the fewest values left (minimum remaining values). 'mrv'
+# breaks ties by the order the variables were given in, 'mrv-degree' by the most unassigned neighbors first.
+# 'dom/wdeg' weighs each constraint by how many times it wiped out a domain, and picks the variable with the
+# fewest values for the total weight of its constraints with unassigned neighbors.
+VARIABLE_ORDERS = ('mrv', 'mrv-degree', 'dom/wdeg')
+
+# Value orders. 'natural' tries values in the order the domain holds them, 'lcv' tries the least constraining
+# value first: the one that would remove the fewest values from the domains of unassigned neighbors.
+VALUE_ORDERS = ('natural', 'lcv')
+
+# The most nogoods a search remembers when learning, before it starts forgetting the oldest, and the most
+# assignments in a nogood worth keeping. Longer ones rarely match again and are slow to check.
+NOGOOD_LIMIT = 2000
+NOGOOD_MAX_SIZE = 16
+
+# Restart policies. The search starts over once a run has backtracked as many times as its cutoff: 'luby'
+# cutoffs follow the Luby sequence times RESTART_BACKTRACKS, 'geometric' ones grow by RESTART_GROWTH each time.
+# Restarts help when ties are broken at random (a seed is given) or nogoods carry over from earlier runs.
+RESTARTS = ('none', 'luby', 'geometric')
+RESTART_BACKTRACKS = 500
+RESTART_GROWTH = 1.5
+
+# A CSP is a (variables, constraints) tuple keyed by variable name. The search runs on a network that
+# numbers the variables 0..n-1 in the order they're given, and translates back to names at the end.
+
+# NETWORK
+
+class Network:
+    """ A constraint table compiled onto integer variable indices. """
+
+    def __init__(self, constraints, names):
+        self.constraints = constraints
+        self.names = names
+        self.index = {name: i for i, name in enumerate(names)}
+
+        # Number the arcs of the table first, in order, so they can seed a full AC3 pass
+        self.arcs = []
+        self.arc_ids = {}
+        for Xi, Xj in constraints:
+            if Xi in self.index and Xj in self.index:
+                self.add_arc(self.index[Xi], self.index[Xj])
+        self.initial = tuple(range(len(self.arcs)))
+
+        # The table's arcs that point at each cell, which are the ones an assignment to it can break
+        self.initial_into = [[] for _ in names]
+        for arc in self.initial:
+            self.initial_into[self.arcs[arc][1]].append(arc)
+
+        # Neighbors stay sorted by name, so ties are broken the same way as with the dict-based CSP
+        cell_neighbors = neighbor_index(constraints)
+        self.neighbors = [tuple(self.index[X] for X in cell_neighbors.get(name, ()) if X in self.index) for name in names]
+
+        # Revising either direction of an arc can require revising the other one
+        self.incoming = []
+        for i, neighbors in enumerate(self.neighbors):
+            self.incoming.append(tuple((k, self.add_arc(k, i)) for k in neighbors))
+
+        # Both directions of an arc belong to the same constraint, numbered in the order they were first seen
+        constraint_ids = {}
+        self.constraint_of = [constraint_ids.setdefault(frozenset(arc), len(constraint_ids)) for arc in self.arcs]
+        self.num_constraints = len(constraint_ids)
+
+        self._supports = {}
+
+    def add_arc(self, i, j):
+        """ Get the id of the arc from cell i to cell j, numbering it if it's new. """
+        if (i, j) not in self.arc_ids:
+            self.arc_ids[(i, j)] = len(self.arcs)
+            self.arcs.append((i, j))
+        return self.arc_ids[(i, j)]
+
+    def supports(self, store):
+        """ Get the store's support entry for each arc, in arc order. """
+        if store.name not in self._supports:
+            index = store.supports(self.constraints)
+            self._supports[store.name] = [index.get((self.names[i], self.names[j]), store.no_support) for i, j in self.arcs]
+        return self._supports[store.name]
+
+_networks = {}
+
+def network_for(constraints, names):
+    """ Get the cached network of a constraint table for variables with the given names. """
+    networks = cached_index(_networks, constraints, lambda constraints: {})
+    if names not in networks:
+        networks[names] = Network(constraints, names)
+    return networks[names]
+
+# PROPAGATION
+
+def propagate(network, domains, store, trail=None, changed=None, stats=None, residues=None, explanations=None,
+              weights=None, start=None):
+    """ Run AC3 over a network's domains in place, returning False if any domain is wiped out.
+
+    Each domain that's replaced is logged on the trail, if one is given, so it can be restored later.
+    If the domains were already propagated before the cell given as changed was narrowed, the queue
+    starts from the table's arcs into that cell instead of every arc in the table.
+    The number of revisions, the longest the queue got, and the number of arcs that weren't queued
+    because they were already waiting are added to stats, if it's given.
+    Passing a list with an entry per arc as residues switches to residual supports. The list can be kept
+    for the whole search, since a stale residue is only a wasted check.
+    If Explanations are given, each cell that's narrowed is blamed on whatever narrowed the cell it lost support
+    in, and a wipeout leaves the levels to blame as their conflict.
+    If a list of weights is given, with one per constraint, the weight of a constraint that wipes out a domain goes up.
+    Given the ids of some arcs as start, the queue starts from those instead.
+    """
+    arcs, incoming = network.arcs, network.incoming
+    supports = network.supports(store)
+
+    # Initialize a deque of the constraint arcs for O(1) pop and push
+    if start is not None:
+        queue = deque(start)
+    elif changed is None:
+        queue = deque(network.initial)
+    else:
+        queue = deque(network.initial_into[changed])
+
+    # Mark which arcs are waiting in the queue, so none of them is queued twice
+    queued = bytearray(len(arcs))
+    for arc in queue:
+        queued[arc] = 1
+
+    consistent = True
+    revisions, peak, duplicates = 0, len(queue), 0
+    while queue:
+        # Pop the leftmost arc and revise it, skipping it if either domain is empty
+        arc = queue.popleft()
+        queued[arc] = 0
+        i, j = arcs[arc]
+        if not domains[i] or not domains[j]:
+            continue
+
+        revisions += 1
+        if residues is None:
+            revised = store.revise(domains[i], domains[j], supports[arc])
+        else:
+            if residues[arc] is None:
+                residues[arc] = {}
+            revised = store.revise_residual(domains[i], domains[j], supports[arc], residues[arc])
+        if revised is None:
+            continue
+        if trail is not None:
+            trail.append((i, domains[i]))
+        domains[i] = revised
+        if explanations is not None:
+            explanations.add(i, explanations.levels[j])
+
+        # False if there are no domains
+        if not revised:
+            if explanations is not None:
+                explanations.conflict = explanations.levels[i]
+            if weights is not None:
+                weights[network.constraint_of[arc]] += 1
+            consistent = False
+            break
+
+        # Append the arcs into cell i from each of its neighbors besides j, unless they're already waiting
+        for k, arc_in in incoming[i]:
+            if k != j:
+                if queued[arc_in]:
+                    duplicates += 1
+                else:
+                    queued[arc_in] = 1
+                    queue.append(arc_in)
+        peak = max(peak, len(queue))
+
+    if stats is not None:
+        stats['revisions'] += revisions
+        stats['peak_queue'] = max(stats['peak_queue'], peak)
+        stats['duplicates_suppressed'] += duplicates
+
+    return consistent
+
+def arcs_into(network, cell):
+    """ Get the ids of every arc into a cell, both directions of the table's constraints included, or every arc for no cell. """
+    if cell is None:
+        return range(len(network.arcs))
+    return [arc for _, arc in network.incoming[cell]]
+
+def propagate_singles(network, domains, store, size, trail=None, changed=None, stats=None, residues=None, explanations=None,
+                      weights=None):
+    """ Run propagate, then place the hidden singles on a size x size board until there are none left.
+
+    Naked singles need nothing more than AC3: once a cell is down to one value, the not-equal arcs take it out of
+    every peer, as long as the queue starts from both directions of the arcs rather than only the table's. A hidden
+    single is a value left in only one cell of a row, column or box, which no pairwise arc can see. That cell is
+    narrowed to the value and propagated from, and a value left in no cell of a unit is a wipeout.
+    Takes the arguments of propagate, with the same meaning, and adds the hidden singles placed to stats.
+    """
+    # Cells narrowed are logged even without a trail, to know which units to check again
+    log = trail if trail is not None else []
+    mark = len(log)
+    if not propagate(network, domains, store, log, changed, stats, residues, explanations, weights, arcs_into(network, changed)):
+        return False
+
+    units, cell_units = sudoku_units(size), sudoku_cell_units(size)
+    if changed is None:
+        dirty = set(range(len(units)))
+    else:
+        dirty = set(cell_units[changed]).union(*(cell_units[i] for i, _ in log[mark:]))
+
+    consistent, hidden = True, 0
+    while dirty and consistent:
+        unit = units[dirty.pop()]
+
+        # Find the cells where each value can still go in the unit
+        places = {}
+        for i in unit:
+            for value in store.values(domains[i]):
+                places.setdefault(value, []).append(i)
+
+        for value in range(1, size + 1):
+            cells = places.get(value)
+            if cells is None:
+                if explanations is not None:
+                    explanations.conflict = 0
+                    for i in unit:
+                        explanations.conflict |= explanations.levels[i]
+                consistent = False
+                break
+            if len(cells) > 1 or store.size(domains[cells[0]]) == 1:
+                continue
+
+            # The value can only go in one cell, so narrow it, blaming whatever took the value out of the others
+            i = cells[0]
+            mark = len(log)
+            log.append((i, domains[i]))
+            domains[i] = store.singleton(value)
+            hidden += 1
+            if explanations is not None:
+                for j in unit:
+                    if j != i:
+                        explanations.add(i, explanations.levels[j])
+
+            # The places found are stale once anything is narrowed, so the unit is checked again with the others
+            consistent = propagate(network, domains, store, log, i, stats, residues, explanations, weights, arcs_into(network, i))
+            dirty.update(cell_units[i], *(cell_units[j] for j, _ in log[mark:]))
+            break
+
+    if stats is not None:
+        stats['hidden_singles'] += hidden
+    return consistent
+
+# SEARCH
+
+class MRVBuckets:
+    """ The unassigned variables in buckets by domain size, so the smallest domain is found without a scan.
+
+    Sizes are only brought up to date for the cells passed to update, which the search takes from its trail.
+    Ties go to the variable with the most unassigned neighbors if by_degree is set, then to the lowest index,
+    or to a variable picked with rng if a random.Random is given.
+    """
+
+    def __init__(self, network, domains, store, by_degree=False, rng=None):
+        self.neighbors = network.neighbors
+        self.store = store
+        self.by_degree = by_degree
+        self.rng = rng
+
+        # Domains only shrink from here, so no bucket past the largest initial size is needed
+        self.sizes = [store.size(domain) for domain in domains]
+        self.buckets = [set() for _ in range(max(self.sizes, default=0) + 1)]
+        for i, size in enumerate(self.sizes):
+            self.buckets[size].add(i)
+
+        # The number of unassigned neighbors of each cell
+        self.degrees = [len(neighbors) for neighbors in network.neighbors]
+
+    def select(self):
+        """ Get the unassigned variable with the fewest domain values, or None if every variable is assigned. """
+        for bucket in self.buckets:
+            if bucket:
+                if self.by_degree:
+                    most = max(self.degrees[i] for i in bucket)
+                    bucket = [i for i in bucket if self.degrees[i] == most]
+
+                # Sorting first keeps the pick the same for the same seed, whatever order the set is in
+                if self.rng is not None:
+                    return self.rng.choice(sorted(bucket))
+                return min(bucket)
+        return None
+
+    def assign(self, var):
+        """ Take an assigned variable out of the buckets. """
+        self.buckets[self.sizes[var]].discard(var)
+        self.sizes[var] = None
+        for k in self.neighbors[var]:
+            self.degrees[k] -= 1
+
+    def unassign(self, var, domain):
+        """ Put a variable back in the buckets once its assignment is taken back. """
+        self.sizes[var] = self.store.size(domain)
+        self.buckets[self.sizes[var]].add(var)
+        for k in self.neighbors[var]:
+            self.degrees[k] += 1
+
+    def update(self, cells, domains):
+        """ Move each unassigned cell whose domain changed size to its new bucket. """
+        for i in cells:
+            old = self.sizes[i]
+            if old is None:
+                continue
+            new = self.store.size(domains[i])
+            if new != old:
+                self.buckets[old].discard(i)
+                self.buckets[new].add(i)
+                self.sizes[i] = new
+
+class DomWdeg:
+    """ The unassigned variables, picked by the fewest domain values for the weight of their constraints (dom/wdeg).
+
+    Each cell's constraint weights are summed over its unassigned neighbors, so the choice takes a scan of the
+    unassigned variables. Ties go to the lowest index. It's kept up to date the same way as MRVBuckets.
+    """
+
+    def __init__(self, network, domains, store, weights):
+        self.store = store
+        self.weights = weights
+        self.sizes = [store.size(domain) for domain in domains]
+        self.unassigned = set(range(len(domains)))
+
+        # The neighbors of each cell with the constraint between them
+        constraint_of = network.constraint_of
+        self.constraints = [tuple((k, constraint_of[arc]) for k, arc in incoming) for incoming in network.incoming]
+
+    def select(self):
+        """ Get the unassigned variable with the smallest dom/wdeg, or None if every variable is assigned. """
+        best, best_score = None, None
+        for i in sorted(self.unassigned):
+            # A variable with no values left fails straight away
+            if not self.sizes[i]:
+                return i
+
+            # A variable with no unassigned neighbors constrains nothing else, so it can wait
+            wdeg = sum(self.weights[c] for k, c in self.constraints[i] if k in self.unassigned)
+            score = self.sizes[i] / wdeg if wdeg else float('inf')
+            if best_score is None or score < best_score:
+                best, best_score = i, score
+        return best
+
+    def assign(self, var):
+        """ Take an assigned variable out of the choice. """
+        self.unassigned.discard(var)
+
+    def unassign(self, var, domain):
+        """ Put a variable back in the choice once its assignment is taken back. """
+        self.sizes[var] = self.store.size(domain)
+        self.unassigned.add(var)
+
+    def update(self, cells, domains):
+        """ Record the new domain size of each unassigned cell that changed. """
+        for i in cells:
+            if i in self.unassigned:
+                self.sizes[i] = self.store.size(domains[i])
+
+def luby(i):
+    """ Get the i-th term, counting from 0, of the Luby sequence 1, 1, 2, 1, 1, 2, 4, 1, 1, 2, ... """
+    # Find the smallest complete subsequence that holds term i, then the term's place within it
+    size, exponent = 1, 0
+    while size < i + 1:
+        exponent += 1
+        size = 2 * size + 1
+
+    while size - 1 != i:
+        size = (size - 1) >> 1
+        exponent -= 1
+        i %= size
+    return 2 ** exponent
+
+def restart_cutoff(restarts, run):
+    """ Get how many backtracks a run of the search can take under a restart policy, or None for no limit. """
+    if restarts == 'luby':
+        return luby(run) * RESTART_BACKTRACKS
+    if restarts == 'geometric':
+        return int(RESTART_BACKTRACKS * RESTART_GROWTH ** run)
+    return None
+
+def undo(domains, trail, mark):
+    """ Restore the domains logged on the trail since it was at the given length. """
+    while len(trail) > mark:
+        cell, domain = trail.pop()
+        domains[cell] = domain
+
+class Explanations:
+    """ For each cell, a bitmask of the decision levels whose assignments narrowed its domain.
+
+    Bit L is set when the assignment made at depth L of the search, or something it narrowed, removed values
+    from the cell. The masks only grow along a branch, and are logged on their own trail to be undone with it.
+    """
+
+    def __init__(self, size):
+        self.levels = [0] * size
+        self.trail = []
+        self.conflict = 0
+
+    def add(self, i, levels):
+        """ Blame the given levels for narrowing cell i as well. """
+        if levels & ~self.levels[i]:
+            self.trail.append((i, self.levels[i]))
+            self.levels[i] |= levels
+
+class Nogoods:
+    """ A bounded store of learned nogoods: sets of (variable, value) assignments known to leave no solution.
+
+    Each nogood is indexed under every assignment in it, so the ones a new assignment could complete are found
+    directly. Once the store is full, the oldest nogood is forgotten to make room for the next.
+    """
+
+    def __init__(self, limit=NOGOOD_LIMIT, max_size=NOGOOD_MAX_SIZE):
+        self.limit = limit
+        self.max_size = max_size
+        self.nogoods = {}
+        self.index = {}
+
+    def learn(self, literals):
+        """ Remember a nogood, returning False if it was already known or is too long to keep. """
+        nogood = frozenset(literals)
+        if len(nogood) > self.max_size or nogood in self.nogoods:
+            return False
+
+        # The dict keeps the nogoods in the order they were learned, so the first one is the oldest
+        if len(self.nogoods) >= self.limit:
+            oldest = next(iter(self.nogoods))
+            del self.nogoods[oldest]
+            for literal in oldest:
+                self.index[literal].discard(oldest)
+
+        self.nogoods[nogood] = None
+        for literal in nogood:
+            self.index.setdefault(literal, set()).add(nogood)
+        return True
+
+    def violated(self, var, value, assignment):
+        """ Get a nogood that assigning value to var would complete, or None if there's none. """
+        for nogood in self.index.get((var, value), ()):
+            if all(assignment.get(x) == v for x, v in nogood if x != var):
+                return nogood
+        return None
+
+class Budget:
+    """ Limits on how far a search can go, in nodes, backtracks and seconds, with a token that can cancel it.
+
+    The clock starts when the budget is made. The cancel token can be anything with an is_set() method, such as
+    a threading.Event or multiprocessing.Event, so another thread or process can stop the search.
+    """
+
+    def __init__(self, nodes=None, backtracks=None, seconds=None, cancel=None):
+        self.nodes = nodes
+        self.backtracks = backtracks
+        self.deadline = time.perf_counter() + seconds if seconds is not None else None
+        self.cancel = cancel
+
+    def exceeded(self, search):
+        """ Get the name of the limit a search has reached, or None if it can carry on. """
+        if self.cancel is not None and self.cancel.is_set():
+            return 'cancelled'
+        if self.nodes is not None and search.node_count >= self.nodes:
+            return 'nodes'
+        if self.backtracks is not None and search.backtrack_count >= self.backtracks:
+            return 'backtracks'
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            return 'seconds'
+        return None
+
+class ChoicePoint:
+    """ A variable being branched on, with the values to try for it at one level of the search. """
+    __slots__ = ('var', 'values', 'index', 'mark', 'explanation_mark', 'color_num', 'descended', 'conflicts')
+
+    def __init__(self, var, values, color_num):
+        self.var = var
+        self.values = values
+        self.index = 0
+        self.color_num = color_num
+
+        # The trail length before the value in place was assigned, or None if no value is in place
+        self.mark = None
+        self.explanation_mark = None
+        self.descended = False
+
+        # The levels to blame for the values of var that failed or were removed before it was chosen
+        self.conflicts = 0
+
+class Search:
+    """ Backtracking search over a network, looping over an explicit stack of choice points.
+
+    Each step tries one value, so a search can be run a slice at a time, resumed, or cancelled between nodes.
+    Until the domains have been through a full AC3 pass, each assignment is followed by one. After that,
+    propagation only starts from the variable that was just assigned.
+    With backjumping, each level collects the levels to blame for its failures (its conflict set). Once its
+    values run out, the search jumps straight back to the most recent level in that set, skipping the levels
+    in between, since no other value for them could have made a difference (conflict-directed backjumping).
+    With learning, the conflict sets are also kept as nogoods, which are checked before each value is tried.
+    With restarts, the search starts over from the root whenever a run reaches its cutoff of backtracks.
+    Given a board_size, propagation places hidden singles on the board as well (see propagate_singles).
+    """
+
+    def __init__(self, network, domains, store, stats=None, residues=None, variable_order='mrv', value_order='natural',
+                 backjumping=False, learning=False, seed=None, restarts='none', trace=True, board_size=None):
+        self.network = network
+        self.domains = domains
+        self.store = store
+        self.stats = stats
+        self.residues = residues
+        self.board_size = board_size
+        self.value_order = value_order
+
+        # The search state: changed domains, the current assignment and the order it was made in, and the choices
+        self.trail = []
+        self.assignment = {}
+        self.order = []
+        self.stack = []
+
+        # Constraint weights last the whole search, across restarts
+        self.weights = [1] * network.num_constraints if variable_order == 'dom/wdeg' else None
+        if self.weights is not None:
+            self.variables = DomWdeg(network, domains, store, self.weights)
+        else:
+            rng = random.Random(seed) if seed is not None else None
+            self.variables = MRVBuckets(network, domains, store, by_degree = variable_order == 'mrv-degree', rng = rng)
+        self.backjumping = backjumping
+        self.explanations = Explanations(len(domains)) if backjumping or learning else None
+        self.nogoods = Nogoods() if learning else None
+        self.level_of = [None] * len(domains)
+
+        # The trace, with the same meaning as the results of backtracking_search. Without it, only backtracks are counted.
+        self.trace = trace
+        self.progress = []
+        self.snapshots = []
+        self.failed_values = [[] for _ in domains]
+        self.backtracks = [0] * len(domains)
+
+        # The nodes and backtracks so far, and the limit that stopped the search early, if any
+        self.node_count = 0
+        self.backtrack_count = 0
+        self.exceeded = None
+
+        # The backtracks the current run has taken, and how many it can take before starting over
+        self.restarts = restarts
+        self.runs = 0
+        self.run_backtracks = 0
+        self.cutoff = restart_cutoff(restarts, 0)
+
+        self.solution = None
+        self.finished = False
+        self.branch(0)
+
+    def branch(self, color_num):
+        """ Push a choice point for the next variable, or finish with the solution if every variable is assigned. """
+        if len(self.assignment) == len(self.domains):
+            self.solution = dict(self.assignment)
+            self.finished = True
+            return
+
+        # Use the minimum remaining values heuristic to choose the unassigned variable
+        var = self.variables.select()
+        point = ChoicePoint(var, self.ordered_values(var), color_num)
+        if self.explanations is not None:
+            point.conflicts = self.explanations.levels[var]
+        self.stack.append(point)
+
+    def ordered_values(self, var):
+        """ Get the values to try for a variable, in the search's value order. """
+        values = self.store.values(self.domains[var])
+        if self.value_order == 'natural' or len(values) < 2:
+            return values
+
+        # Count the values each one would remove from unassigned neighbors, over the arcs into var
+        domains, store, supports = self.domains, self.store, self.network.supports(self.store)
+        neighbors = [(domains[k], supports[arc]) for k, arc in self.network.incoming[var] if k not in self.assignment]
+        removed = {}
+        for value in values:
+            fixed = store.singleton(value)
+            removed[value] = 0
+            for domain, allowed in neighbors:
+                revised = store.revise(domain, fixed, allowed)
+                if revised is not None:
+                    removed[value] += store.size(domain) - store.size(revised)
+
+        # Sorting is stable, so tied values keep their natural order
+        return sorted(values, key = removed.get)
+
+    def retract(self, point):
+        """ Take back the value in place at a choice point, restoring only the domains that changed since. """
+        changed = {i for i, _ in self.trail[point.mark:]}
+        undo(self.domains, self.trail, point.mark)
+        if self.explanations is not None:
+            undo(self.explanations.levels, self.explanations.trail, point.explanation_mark)
+        del self.assignment[point.var]
+        self.level_of[point.var] = None
+        self.variables.unassign(point.var, self.domains[point.var])
+        self.variables.update(changed, self.domains)
+        if point.descended:
+            self.order.pop()
+
+        point.mark = None
+        point.descended = False
+
+    def step(self):
+        """ Try the next value at the top of the stack, returning True once the search is finished. """
+        if self.finished:
+            return True
+
+        point = self.stack[-1]
+        if point.mark is not None:
+            self.retract(point)
+
+        # Once every value has been tried, go back up, finishing without a solution past the root
+        if point.index == len(point.values):
+            self.stack.pop()
+            if self.explanations is not None:
+                self.learn(point.conflicts)
+                if self.backjumping:
+                    self.backjump(point.conflicts)
+                elif self.stack:
+                    self.stack[-1].conflicts |= point.conflicts & ~(1 << len(self.stack) - 1)
+            self.finished = not self.stack
+            return self.finished
+
+        var, value = point.var, point.values[point.index]
+        point.index += 1
+
+        # Skip the value without searching below it if it would complete a learned nogood
+        if self.nogoods is not None:
+            nogood = self.nogoods.violated(var, value, self.assignment)
+            if nogood is not None:
+                if self.trace:
+                    self.failed_values[var].append(value)
+                self.backtracks[var] += 1
+                for x, _ in nogood:
+                    if x != var:
+                        point.conflicts |= 1 << self.level_of[x]
+                if self.stats is not None:
+                    self.stats['nogood_prunes'] += 1
+                self.backtracked()
+                return self.finished
+        self.node_count += 1
+        if self.stats is not None:
+            self.stats['nodes'] += 1
+
+        # Assign the value, logging the domain it replaces so the changes below can be undone
+        point.mark = len(self.trail)
+        self.assignment[var] = value
+        self.variables.assign(var)
+        self.trail.append((var, self.domains[var]))
+        self.domains[var] = self.store.singleton(value)
+
+        # The assigned cell is to blame on this level
+        level = len(self.stack) - 1
+        self.level_of[var] = level
+        if self.explanations is not None:
+            point.explanation_mark = len(self.explanations.trail)
+            self.explanations.add(var, 1 << level)
+
+        # Use AC-3 to keep arc consistency with the new assignment
+        changed = var if level else None
+        if self.propagate(self.domains, self.trail, changed):
+            self.variables.update({i for i, _ in self.trail[point.mark:]}, self.domains)
+
+            # If the cell hasn't been assigned, add it to the progress with the incremented color number
+            if len(point.values) > 1:
+                point.color_num += 1
+                if self.trace:
+                    self.progress.append((var, value, point.color_num))
+
+            self.order.append(var)
+            point.descended = True
+            self.branch(point.color_num)
+        else:
+            # If this value led to failure, record it
+            self.backtracks[var] += 1
+            if self.explanations is not None:
+                conflict = self.explanations.conflict & ~(1 << level)
+                point.conflicts |= conflict
+                self.learn(conflict, (var, value))
+
+            # Store the domains for unassigned variables before backtracking, already named for the trace
+            if self.trace:
+                self.failed_values[var].append(value)
+                names, store = self.network.names, self.store
+                self.snapshots.append({names[i]: store.as_list(d) for i, d in enumerate(self.domains) if i not in self.assignment})
+            self.backtracked()
+
+        return self.finished
+
+    def propagate(self, domains, trail=None, changed=None):
+        """ Propagate over domains with the search's options, returning False if any domain is wiped out. """
+        if self.board_size is None:
+            return propagate(self.network, domains, self.store, trail, changed, self.stats, self.residues, self.explanations,
+                             self.weights)
+        return propagate_singles(self.network, domains, self.store, self.board_size, trail, changed, self.stats, self.residues,
+                                 self.explanations, self.weights)
+
+    def backtracked(self):
+        """ Count a backtrack against the current run, starting over once the run reaches its cutoff. """
+        self.backtrack_count += 1
+        self.run_backtracks += 1
+        if self.cutoff is None or self.run_backtracks < self.cutoff:
+            return
+
+        # Take back every assignment, then branch again from the root with the next cutoff
+        while self.stack:
+            point = self.stack.pop()
+            if point.mark is not None:
+                self.retract(point)
+
+        self.runs += 1
+        self.run_backtracks = 0
+        self.cutoff = restart_cutoff(self.restarts, self.runs)
+        if self.stats is not None:
+            self.stats['restarts'] += 1
+        self.branch(0)
+
+    def learn(self, conflicts, *literals):
+        """ Learn the assignments at the levels in a conflict set, with any literals given, as a nogood. """
+        if self.nogoods is None or not conflicts and not literals:
+            return
+
+        # Each set bit is the level of an assignment to blame
+        while conflicts:
+            level = conflicts.bit_length() - 1
+            var = self.stack[level].var
+            literals += ((var, self.assignment[var]),)
+            conflicts &= ~(1 << level)
+
+        if self.nogoods.learn(literals) and self.stats is not None:
+            self.stats['nogoods_learned'] += 1
+
+    def backjump(self, conflicts):
+        """ Go back to the most recent level in an exhausted level's conflict set, passing the rest of the set on. """
+        # With no level to blame, no other assignment can help, so every level is taken back
+        target = conflicts.bit_length() - 1
+        while len(self.stack) > target + 1:
+            self.retract(self.stack.pop())
+            if self.stats is not None:
+                self.stats['levels_skipped'] += 1
+
+        if self.stack:
+            self.stack[-1].conflicts |= conflicts & ~(1 << target)
+
+    def run(self, max_steps=None, budget=None):
+        """ Step until the search finishes, until max_steps values have been tried, or until the budget runs out.
+
+        Returns whether it finished. Running out of budget cancels the search, and the limit reached is kept as exceeded.
+        """
+        steps = 0
+        while not self.finished and (max_steps is None or steps < max_steps):
+            if budget is not None:
+                self.exceeded = budget.exceeded(self)
+                if self.exceeded is not None:
+                    self.cancel()
+                    break
+            self.step()
+            steps += 1
+        return self.finished
+
+    def cancel(self):
+        """ Stop the search between nodes. It finishes without a solution, unless one was already found. """
+        self.finished = True
+
+    def resume(self):
+        """ Carry on past the solution found to look for the next one, returning False if there's nowhere left to look. """
+        if self.solution is None or not self.stack:
+            return False
+
+        # A level with a solution below it didn't fail, so it can't be jumped over or learned as a nogood.
+        # Blaming each level on all the levels before it keeps both sound.
+        if self.explanations is not None:
+            for level, point in enumerate(self.stack):
+                point.conflicts |= (1 << level) - 1
+
+        self.solution = None
+        self.finished = False
+        return True
+
+    def solutions(self):
+        """ Yield each solution as a dict from variable names to values, searching for the next one only when it's asked for. """
+        names = self.network.names
+
+        # If propagation alone wipes out a domain or settles every one, there's no need to search
+        domains = list(self.domains)
+        if not self.propagate(domains):
+            return
+        if solved(self.network, domains, self.store):
+            yield {name: self.store.values(domain)[0] for name, domain in zip(names, domains)}
+            return
+
+        # Otherwise carry on past each solution until there are no more
+        while self.run():
+            if self.solution is None:
+                return
+            yield {names[i]: self.solution[i] for i in self.order}
+            if not self.resume():
+                return
+
+    def results(self):
+        """ Get the results of backtracking_search, translated back to variable names. """
+        # The solution, the (variable, value, color number) progress, the order of assignment,
+        # the domains after each failure, and the failed values and backtracks for each variable
+        names = self.network.names
+        solution = {names[i]: self.solution[i] for i in self.order} if self.solution is not None else None
+        return (
+            solution,
+            [(names[i], value, color_num) for i, value, color_num in self.progress],
+            [names[i] for i in self.order] if self.solution is not None else [],
+            self.snapshots,
+            dict(zip(names, self.failed_values)),
+            dict(zip(names, self.backtracks)),
+        )
+
+# DICT-BASED CSP
+
+def revise(csp, Xi, Xj, store=ListDomains):
+    """ Removes values from Xi's domain that don't satisfy constraints with anything in Xj's domain. """
+    variables, constraints = csp
+
+    # If revise cannot be done, return False
+    if not variables.get(Xi) or not variables.get(Xj):
+        return False
+
+    # Get the constraint between the variables in the store's format, then let the store filter Xi's domain
+    allowed = store.supports(constraints).get((Xi, Xj), store.no_support)
+    revised = store.revise(variables[Xi], variables[Xj], allowed)
+
+    # Replace the domain only if some value was removed
+    if revised is None:
+        return False
+
+    variables[Xi] = revised
+    return True
+
+def get_neighbors(csp, X):
+    """ Helper function to get the cells with which cell X has a constraint. """
+    # The neighbors of every cell are indexed once per constraint table
+    return set(neighbor_index(csp[1]).get(X, ()))
+
+def AC3(csp, store=ListDomains):
+    """ Removes any inconsistencies across all domains in the given CSP. """
+    variables, constraints = csp
+
+    # Run AC3 on the network, then write the domains back by name
+    network = network_for(constraints, tuple(variables))
+    domains = list(variables.values())
+    consistent = propagate(network, domains, store)
+
+    for name, domain in zip(network.names, domains):
+        variables[name] = domain
+
+    return consistent
+
+def minimum_remaining_values(csp, assignments, store=ListDomains):
+    """ Among the unassigned variables, finds the one with the fewest domain values. """
+    variables = csp[0]
+    unassigned_vars = {}
+
+    # Check each variable's domains and record their lengths
+    for variable, domain in variables.items():
+        if variable not in assignments:
+            unassigned_vars[variable] = store.size(domain)
+
+    # Get the variable with the minimum domain length
+    minimum_variable = min(unassigned_vars, key = unassigned_vars.get, default = None)
+    return minimum_variable
+
+def solved(network, domains, store):
+    """ Check whether every domain is down to a single value, with every constraint between them satisfied. """
+    if any(store.size(domain) != 1 for domain in domains):
+        return False
+
+    # Revising a singleton against a singleton only removes its value if the pair isn't allowed
+    supports = network.supports(store)
+    return all(store.revise(domains[i], domains[j], allowed) is None for (i, j), allowed in zip(network.arcs, supports))
+
+def search_for(csp, domains='list', propagation='ac3', variable_order='mrv', value_order='natural',
+               backjumping=False, learning=False, seed=None, restarts='none', singles=False, stats=None, trace=True):
+    """ Set up a Search over a CSP with the options of backtracking_search, resetting the stats dict if one is given. """
+    variables, constraints = csp
+    store = domain_store(domains)
+    if propagation not in PROPAGATIONS:
+        raise ValueError(f"Unknown propagation '{propagation}', expected one of: {', '.join(PROPAGATIONS)}.")
+    if variable_order not in VARIABLE_ORDERS:
+        raise ValueError(f"Unknown variable order '{variable_order}', expected one of: {', '.join(VARIABLE_ORDERS)}.")
+    if value_order not in VALUE_ORDERS:
+        raise ValueError(f"Unknown value order '{value_order}', expected one of: {', '.join(VALUE_ORDERS)}.")
+    if restarts not in RESTARTS:
+        raise ValueError(f"Unknown restart policy '{restarts}', expected one of: {', '.join(RESTARTS)}.")
+
+    # Hidden singles need the rows, columns and boxes of a board
+    board_size = sudoku_size(csp) if singles else None
+    if singles and board_size is None:
+        raise ValueError("Hidden singles need a Sudoku board built by variables_from_puzzle.")
+
+    # Number the variables and convert their domains into the store's format
+    network = network_for(constraints, tuple(variables))
+    initial_domains = [store.from_list(domain) for domain in variables.values()]
+
+    stats = {} if stats is None else stats
+    stats.update(nodes=0, levels_skipped=0, nogoods_learned=0, nogood_prunes=0, restarts=0, revisions=0, peak_queue=0,
+                 duplicates_suppressed=0, hidden_singles=0)
+
+    # Residual supports are remembered per arc for the whole search
+    residues = [None] * len(network.arcs) if propagation == 'residual' else None
+
+    return Search(network, initial_domains, store, stats, residues, variable_order, value_order, backjumping, learning,
+                  seed, restarts, trace, board_size)
+
+def backtracking_search(csp, domains='list', propagation='ac3', variable_order='mrv', value_order='natural',
+                        backjumping=False, learning=False, seed=None, restarts='none', singles=False, max_nodes=None,
+                        max_backtracks=None, timeout=None, cancel=None, stats=None):
+    """ Solve a CSP with backtracking search, with domains held in the named store.
+
+    Propagation is one of PROPAGATIONS, variable_order one of VARIABLE_ORDERS and value_order one of VALUE_ORDERS.
+    With backjumping, the search jumps back past levels that had nothing to do with a failure.
+    With learning, the assignments behind each failure are remembered as nogoods, up to NOGOOD_LIMIT of them.
+    Given a seed, the minimum remaining values orders break ties between variables at random, the same way each time
+    for the same seed.
+    Restarts is one of RESTARTS.
+    With singles, propagation also places hidden singles: values left in only one cell of a row, column or box.
+    This needs a Sudoku board built by variables_from_puzzle.
+    The search gives up once it has tried max_nodes values, backtracked max_backtracks times, run for timeout seconds,
+    or been cancelled through the cancel token (see Budget). It then returns no solution, with the trace so far.
+    If a stats dict is given, it's filled in with counts about the solve, and its status says whether the search was
+    'solved', 'unsatisfiable' or 'budget exceeded', in which case exceeded names the limit that was reached.
+    """
+    budget = Budget(max_nodes, max_backtracks, timeout, cancel)
+    stats = {} if stats is None else stats
+
+    # Search from an empty assignment until it finishes or runs out of budget
+    search = search_for(csp, domains, propagation, variable_order, value_order, backjumping, learning, seed, restarts, singles,
+                        stats)
+    search.run(budget = budget)
+
+    if search.exceeded is not None:
+        stats.update(status='budget exceeded', exceeded=search.exceeded)
+    else:
+        stats['status'] = 'solved' if search.solution is not None else 'unsatisfiable'
+    return search.results()
+
+def iter_solutions(csp, **options):
+    """ Yield each solution of a CSP as a dict from variable names to values, finding each one only when it's asked for.
+
+    Takes the options of backtracking_search, apart from restarts, which would find the same solutions again.
+    No trace is recorded, so nothing grows between solutions apart from the search's own stack and trail.
+    """
+    if options.get('restarts', 'none') != 'none':
+        raise ValueError("Restarts would find the same solutions again, so they can't be used to enumerate solutions.")
+    return search_for(csp, trace=False, **options).solutions()
+
+def count_solutions(csp, limit=None, **options):
+    """ Count the solutions of a CSP, stopping as soon as limit of them have been found. Takes the options of iter_solutions. """
+    count = 0
+    if limit is not None and limit <= 0:
+        return count
+
+    for _ in iter_solutions(csp, **options):
+        count += 1
+        if count == limit:
+            break
+    return count
@@ -0,0 +1,211 @@
+from sudoku_constraints import sudoku_size, sudoku_units
+
+# Sudoku as an exact cover problem, solved with Knuth's Algorithm X on dancing links. Each candidate
+# (cell, value) is a row that covers four columns: the cell, and the value in the cell's row, column and box.
+# The links are kept in flat lists of node indices rather than node objects, which is much faster in Python.
+
+class DancingLinks:
+    """ A sparse exact cover matrix as circular doubly linked lists, with Algorithm X to solve it. """
+
+    def __init__(self, num_columns):
+        # Node 0 is the root, nodes 1..num_columns are the column headers
+        self.L = [num_columns] + list(range(num_columns))
+        self.R = list(range(1, num_columns + 1)) + [0]
+        self.U = list(range(num_columns + 1))
+        self.D = list(range(num_columns + 1))
+        self.C = list(range(num_columns + 1))
+        self.S = [0] * (num_columns + 1)
+        self.row_of = [None] * (num_columns + 1)
+
+    def add_row(self, row, columns):
+        """ Add a row with a node in each of the given 1-indexed columns. """
+        first = len(self.C)
+        for offset, column in enumerate(columns):
+            node = first + offset
+
+            # Link the node in at the bottom of its column
+            self.C.append(column)
+            self.U.append(self.U[column])
+            self.D.append(column)
+            self.D[self.U[column]] = node
+            self.U[column] = node
+            self.S[column] += 1
+            self.row_of.append(row)
+
+            # Link it into the row to the right of the previous node
+            self.L.append(node - 1 if offset else node)
+            self.R.append(first)
+            if offset:
+                self.R[node - 1] = node
+                self.L[first] = node
+
+    def cover(self, column):
+        """ Remove a column and every row that has a node in it. """
+        L, R, U, D, C, S = self.L, self.R, self.U, self.D, self.C, self.S
+        L[R[column]] = L[column]
+        R[L[column]] = R[column]
+
+        i = D[column]
+        while i != column:
+            j = R[i]
+            while j != i:
+                U[D[j]] = U[j]
+                D[U[j]] = D[j]
+                S[C[j]] -= 1
+                j = R[j]
+            i = D[i]
+
+    def uncover(self, column):
+        """ Put back a column and its rows, in the reverse order they were removed. """
+        L, R, U, D, C, S = self.L, self.R, self.U, self.D, self.C, self.S
+        i = U[column]
+        while i != column:
+            j = L[i]
+            while j != i:
+                S[C[j]] += 1
+                U[D[j]] = j
+                D[U[j]] = j
+                j = L[j]
+            i = U[i]
+
+        L[R[column]] = column
+        R[L[column]] = column
+
+    def select(self, node):
+        """ Take a row into the cover by covering every other column it has a node in. """
+        j = self.R[node]
+        while j != node:
+            self.cover(self.C[j])
+            j = self.R[j]
+
+    def deselect(self, node):
+        """ Undo select, uncovering the row's other columns in reverse. """
+        j = self.L[node]
+        while j != node:
+            self.uncover(self.C[j])
+            j = self.L[j]
+
+    def smallest_column(self):
+        """ Get the uncovered column with the fewest rows, or the root if every column is covered. """
+        R, S = self.R, self.S
+        best, best_size = 0, None
+        column = R[0]
+        while column:
+            if best_size is None or S[column] < best_size:
+                best, best_size = column, S[column]
+                if not best_size:
+                    break
+            column = R[column]
+        return best
+
+def sudoku_cover(size, domains):
+    """ Build the exact cover matrix of a board, with a row for each value left in each cell's domain. """
+    # Each unit gets one column per value, after the column for every cell
+    cells = size * size
+    unit_of = [[] for _ in range(cells)]
+    for unit_index, unit in enumerate(sudoku_units(size)):
+        for cell in unit:
+            unit_of[cell].append(unit_index)
+
+    links = DancingLinks(cells * 4)
+    rows = []
+    for cell, domain in enumerate(domains):
+        # A value outside the board has no column to cover, so it can never be part of a solution
+        for value in domain:
+            if not 1 <= value <= size:
+                continue
+            columns = [cell + 1] + [cells + unit * size + value for unit in unit_of[cell]]
+            links.add_row(len(rows), columns)
+            rows.append((cell, value))
+
+    return links, rows
+
+def dlx_search(csp, stats=None):
+    """ Solve a Sudoku CSP as an exact cover problem, returning the same results as backtracking_search.
+
+    A progress step is recorded for each row chosen out of several, and a failed value for each row that
+    leaves some column impossible to cover. If a stats dict is given, the number of rows tried is added to it.
+    """
+    variables, constraints = csp
+    size = sudoku_size(csp)
+    if size is None:
+        raise ValueError("The dancing links solver only handles Sudoku boards built by variables_from_puzzle.")
+
+    names = tuple(variables)
+    links, rows = sudoku_cover(size, variables.values())
+    D, C, S, row_of = links.D, links.C, links.S, links.row_of
+
+    # Store the counts and assignments like backtracking_search
+    progress, snapshots = [], []
+    failed_values = {name: [] for name in names}
+    backtracks = {name: 0 for name in names}
+    nodes = 0
+
+    # Each level of the stack is [column, row node being tried, color number, whether the column was a choice]
+    stack = []
+    column = links.smallest_column()
+    if column:
+        links.cover(column)
+        stack.append([column, column, 0, S[column] > 1])
+
+    while stack:
+        level = stack[-1]
+        column, node, color_num, choice = level
+
+        # Take back the row tried last at this level, then move down to the next one
+        if node != column:
+            links.deselect(node)
+        node = level[1] = D[node]
+
+        # Once every row of the column has been tried, go back up a level
+        if node == column:
+            links.uncover(column)
+            stack.pop()
+            continue
+
+        nodes += 1
+        cell, value = rows[row_of[node]]
+        links.select(node)
+        next_column = links.smallest_column()
+
+        # If some column can no longer be covered, this value fails for the cell
+        if next_column and not S[next_column]:
+            failed_values[names[cell]].append(value)
+            backtracks[names[cell]] += 1
+            snapshots.append(remaining_domains(links, rows, names, size))
+            continue
+
+        # Record the step if the row was one of several choices, carrying the color number down
+        if choice:
+            color_num = level[2] = color_num + 1
+            progress.append((names[cell], value, color_num))
+
+        # If every column is covered, the rows on the stack are the solution
+        if not next_column:
+            break
+
+        links.cover(next_column)
+        stack.append([next_column, next_column, color_num, S[next_column] > 1])
+
+    if stats is not None:
+        stats['nodes'] = stats.get('nodes', 0) + nodes
+
+    # Read the solution and the order of assignment off the stack
+    chosen = [rows[row_of[level[1]]] for level in stack]
+    solution = {names[cell]: value for cell, value in chosen} if stack else None
+    return solution, progress, [names[cell] for cell, _ in chosen], snapshots, failed_values, backtracks
+
+def remaining_domains(links, rows, names, size):
+    """ Get the values left in each uncovered cell column, named for the trace. """
+    D, row_of = links.D, links.row_of
+    domains = {}
+    column = links.R[0]
+    while column and column <= size * size:
+        domain = []
+        node = D[column]
+        while node != column:
+            domain.append(rows[row_of[node]][1])
+            node = D[node]
+        domains[names[column - 1]] = domain
+        column = links.R[column]
+    return domains
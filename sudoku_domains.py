@@ -0,0 +1,137 @@
+from sudoku_constraints import NOT_EQUAL, support_index, support_mask_index
+
+# Domain stores decide how a variable's domain is represented. The search only goes through these
+# methods, so any store gives the same solution and trace as long as values come out in the same order.
+# Domains are never changed in place: revise returns a new domain, so the search can keep the old one
+# on its trail and put it back when it backtracks.
+
+class ListDomains:
+    """ Domains stored as lists of values, in the order they were given. """
+    name = 'list'
+    no_support = frozenset()
+
+    @staticmethod
+    def from_list(values):
+        return list(values)
+
+    @staticmethod
+    def as_list(domain):
+        return domain
+
+    @staticmethod
+    def values(domain):
+        return domain
+
+    @staticmethod
+    def size(domain):
+        return len(domain)
+
+    @staticmethod
+    def singleton(value):
+        return [value]
+
+    @staticmethod
+    def supports(constraints):
+        return support_index(constraints)
+
+    @staticmethod
+    def revise(Di, Dj, allowed):
+        """ Get Di without the values that nothing in Dj supports, or None if nothing is removed. """
+        # A not-equal arc can only remove the value Xj is fixed to
+        if allowed is NOT_EQUAL:
+            if len(Dj) == 1 and Dj[0] in Di:
+                return [x for x in Di if x != Dj[0]]
+            return None
+
+        # Keep each value that's allowed with any value in Dj
+        kept = [x for x in Di if any((x, y) in allowed for y in Dj)]
+        return kept if len(kept) < len(Di) else None
+
+    @staticmethod
+    def revise_residual(Di, Dj, allowed, residues):
+        """ Revise Di, first checking the support last found in Dj for each value and recording new ones. """
+        if allowed is NOT_EQUAL:
+            return ListDomains.revise(Di, Dj, allowed)
+
+        kept = []
+        for x in Di:
+            # The last support is usually still in Dj, otherwise search Dj for a new one
+            residue = residues.get(x)
+            if residue is not None and residue in Dj:
+                kept.append(x)
+                continue
+
+            for y in Dj:
+                if (x, y) in allowed:
+                    residues[x] = y
+                    kept.append(x)
+                    break
+
+        return kept if len(kept) < len(Di) else None
+
+class BitmaskDomains:
+    """ Domains stored as ints with bit v set when v is a possible value, iterated in ascending order. """
+    name = 'bitmask'
+    no_support = {}
+
+    @staticmethod
+    def from_list(values):
+        domain = 0
+        for value in values:
+            domain |= 1 << value
+        return domain
+
+    @staticmethod
+    def as_list(domain):
+        return BitmaskDomains.values(domain)
+
+    @staticmethod
+    def values(domain):
+        values = []
+        while domain:
+            # Take the lowest set bit off the domain
+            lowest = domain & -domain
+            values.append(lowest.bit_length() - 1)
+            domain ^= lowest
+        return values
+
+    @staticmethod
+    def size(domain):
+        return bin(domain).count('1')
+
+    @staticmethod
+    def singleton(value):
+        return 1 << value
+
+    @staticmethod
+    def supports(constraints):
+        return support_mask_index(constraints)
+
+    @staticmethod
+    def revise(Di, Dj, allowed):
+        """ Get Di without the values that nothing in Dj supports, or None if nothing is removed. """
+        # Dj is a singleton when clearing its lowest bit leaves nothing
+        if allowed is NOT_EQUAL:
+            if not Dj & (Dj - 1) and Di & Dj:
+                return Di & ~Dj
+            return None
+
+        # Keep each value whose supporting values overlap Dj
+        kept = Di
+        for x in BitmaskDomains.values(Di):
+            if not allowed.get(x, 0) & Dj:
+                kept &= ~(1 << x)
+        return kept if kept != Di else None
+
+    @staticmethod
+    def revise_residual(Di, Dj, allowed, residues):
+        """ Revise Di. Each support check is already a single AND, so there's nothing to gain from residues. """
+        return BitmaskDomains.revise(Di, Dj, allowed)
+
+DOMAIN_STORES = {store.name: store for store in (ListDomains, BitmaskDomains)}
+
+def domain_store(name):
+    """ Get a domain store by name. """
+    if name not in DOMAIN_STORES:
+        raise ValueError(f"Unknown domain store '{name}', expected one of: {', '.join(DOMAIN_STORES)}.")
+    return DOMAIN_STORES[name]
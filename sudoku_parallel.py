@@ -0,0 +1,234 @@
+import multiprocessing
+import os
+import queue
+import time
+from sudoku_csp import backtracking_search, network_for, propagate
+from sudoku_domains import ListDomains
+
+# Solving with several processes at once. Each worker runs backtracking_search with a multiprocessing.Event
+# as its cancel token, and sends back what it found on a queue. Only answers and small messages go on the
+# queue: a worker that was cancelled sends its stats without its trace.
+
+# Configurations of backtracking_search that race each other in a portfolio, each strong on different boards
+PORTFOLIO = (
+    {'backjumping': True, 'learning': True},
+    {'backjumping': True, 'learning': True, 'value_order': 'lcv'},
+    {'backjumping': True, 'learning': True, 'seed': 1},
+    {'domains': 'bitmask', 'propagation': 'residual', 'backjumping': True},
+)
+
+# Seconds to wait for cancelled workers to stop on their own before they're terminated
+CANCEL_GRACE = 5
+
+def solve_configuration(index, csp, options, cancel, results):
+    """ Run one configuration of backtracking_search in a worker, putting (index, results, stats) on the queue. """
+    stats = {}
+    try:
+        solved = backtracking_search(csp, cancel = cancel, stats = stats, **options)
+    except Exception as error:
+        stats.update(status='error', error=repr(error))
+        solved = None
+
+    # A search that didn't finish has nothing worth sending back but its stats
+    if stats['status'] not in ('solved', 'unsatisfiable'):
+        solved = None
+    results.put((index, solved, stats))
+
+def stop_workers(workers, cancel, results, pending):
+    """ Cancel the workers, drain what they still send so none is stuck on the queue, and wait for them to exit.
+
+    Returns the messages that were drained.
+    """
+    cancel.set()
+    drained = []
+    for _ in range(pending):
+        try:
+            drained.append(results.get(timeout = CANCEL_GRACE))
+        except queue.Empty:
+            break
+
+    for worker in workers:
+        worker.join(CANCEL_GRACE)
+        if worker.is_alive():
+            worker.terminate()
+            worker.join()
+    return drained
+
+def portfolio_search(csp, configurations=PORTFOLIO, timeout=None, stats=None):
+    """ Race configurations of backtracking_search in separate processes, returning the results of the first to answer.
+
+    Either a solution or a proof that there's none counts as an answer. The other workers are cancelled as soon
+    as one arrives. If a stats dict is given, it's filled in with the winner's stats, with its index and options.
+    """
+    variables = csp[0]
+    cancel = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target = solve_configuration, args = (index, csp, dict(options, timeout = timeout), cancel, results),
+                                       daemon = True) for index, options in enumerate(configurations)]
+    for worker in workers:
+        worker.start()
+
+    # Take results as they arrive until one of them is an answer, or every worker has given up
+    winner, pending = None, len(workers)
+    while pending and winner is None:
+        index, solved, worker_stats = results.get()
+        pending -= 1
+        if solved is not None:
+            winner = (index, solved, worker_stats)
+
+    stop_workers(workers, cancel, results, pending)
+
+    if stats is not None:
+        if winner is not None:
+            index, _, worker_stats = winner
+            stats.update(worker_stats, winner=index, configuration=configurations[index])
+        else:
+            stats.update(status='budget exceeded', exceeded='seconds')
+
+    if winner is None:
+        return None, [], [], [], {name: [] for name in variables}, {name: 0 for name in variables}
+    return winner[1]
+
+def split_subproblems(csp, count):
+    """ Split a CSP's search tree into at least count subproblems where it can, each a set of top-level assignments.
+
+    Returns a list of (assignments, variables) pairs, where variables holds the domains left after propagating the
+    assignments. The tree is split a level at a time on the cell with the fewest values left, like the search, and
+    branches that propagation wipes out are dropped, so an empty list means the CSP has no solution.
+    """
+    variables, constraints = csp
+    names = tuple(variables)
+    network = network_for(constraints, names)
+    domains = [list(domain) for domain in variables.values()]
+    if not propagate(network, domains, ListDomains):
+        return []
+
+    frontier = [((), domains)]
+    while len(frontier) < count:
+        # Branch every subproblem on its smallest unfixed cell, keeping the values that propagate
+        split, branched = [], False
+        for assignments, domains in frontier:
+            unfixed = [i for i, domain in enumerate(domains) if len(domain) > 1]
+            if not unfixed:
+                split.append((assignments, domains))
+                continue
+
+            branched = True
+            var = min(unfixed, key = lambda i: len(domains[i]))
+            for value in domains[var]:
+                branch = list(domains)
+                branch[var] = [value]
+                if propagate(network, branch, ListDomains, changed = var):
+                    split.append((assignments + ((names[var], value),), branch))
+        frontier = split
+
+        # Stop once every subproblem is solved
+        if not branched:
+            break
+
+    return [(assignments, dict(zip(names, domains))) for assignments, domains in frontier]
+
+def take_subproblem(worker, ranges):
+    """ Take the next subproblem from a worker's own range, or steal half of the largest range left when it's empty.
+
+    Ranges holds [start, end) for each worker. The owner takes from the start and thieves take from the end, so the
+    two only meet over the last subproblem, and the lock on the array settles that. Returns the index taken, or None.
+    """
+    with ranges.get_lock():
+        start, end = ranges[2 * worker], ranges[2 * worker + 1]
+        if start < end:
+            ranges[2 * worker] = start + 1
+            return start
+
+        # Steal from the back of the worker with the most left to do
+        victim = max(range(len(ranges) // 2), key = lambda w: ranges[2 * w + 1] - ranges[2 * w])
+        left = ranges[2 * victim + 1] - ranges[2 * victim]
+        if left <= 0:
+            return None
+        end = ranges[2 * victim + 1]
+        start = end - (left + 1) // 2
+        ranges[2 * victim + 1] = start
+        ranges[2 * worker], ranges[2 * worker + 1] = start + 1, end
+        return start
+
+def solve_subproblems(worker, subproblems, constraints, options, ranges, deadline, cancel, results):
+    """ Solve subproblems in a worker until one has a solution, they run out, or time does.
+
+    Puts one message on the queue when it stops: (status, worker, index of the subproblem solved or None,
+    its results or None, the nodes searched over every subproblem).
+    """
+    nodes, status, winner, solved = 0, 'unsatisfiable', None, None
+    try:
+        while not cancel.is_set():
+            index = take_subproblem(worker, ranges)
+            if index is None:
+                break
+
+            timeout = deadline - time.monotonic() if deadline is not None else None
+            stats = {}
+            result = backtracking_search((subproblems[index][1], constraints), timeout = timeout, cancel = cancel, stats = stats, **options)
+            nodes += stats['nodes']
+
+            # Cancel every other worker as soon as there's a solution
+            if stats['status'] == 'solved':
+                cancel.set()
+                status, winner, solved = 'solved', index, result
+                break
+            if stats['status'] == 'budget exceeded':
+                status = 'cancelled' if stats['exceeded'] == 'cancelled' else 'budget exceeded'
+                break
+    except Exception as error:
+        status = f'error: {error!r}'
+    results.put((status, worker, winner, solved, nodes))
+
+def subtree_search(csp, workers=None, subproblems_per_worker=4, timeout=None, stats=None, **options):
+    """ Solve a CSP by splitting its search tree into subproblems and searching them in worker processes.
+
+    Takes the options of backtracking_search. Each of workers processes (one per core by default) starts with its
+    share of about subproblems_per_worker subproblems each, and steals from the others once it runs out, so a
+    worker stuck on a hard subtree doesn't hold up the rest. The first solution found cancels every worker.
+    Returns the results of the search that solved its subproblem, so the trace only covers that subtree.
+    If a stats dict is given, it's filled in with the status, the subproblem that was solved, and the nodes
+    searched by every worker.
+    """
+    variables, constraints = csp
+    workers = workers or os.cpu_count() or 1
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    subproblems = split_subproblems(csp, workers * subproblems_per_worker)
+    workers = max(1, min(workers, len(subproblems)))
+
+    # Deal the subproblems out in contiguous ranges, so each worker starts with its share in search order
+    bounds = [len(subproblems) * w // workers for w in range(workers + 1)]
+    ranges = multiprocessing.Array('i', [bound for w in range(workers) for bound in (bounds[w], bounds[w + 1])])
+    cancel = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target = solve_subproblems, args = (worker, subproblems, constraints, options, ranges, deadline, cancel, results),
+                                         daemon = True) for worker in range(workers if subproblems else 0)]
+    for process in processes:
+        process.start()
+
+    # Wait for a solution, or for every worker to stop without one
+    messages = []
+    for _ in processes:
+        messages.append(results.get())
+        if messages[-1][0] == 'solved':
+            break
+    messages += stop_workers(processes, cancel, results, len(processes) - len(messages))
+
+    # Without a solution, the CSP is only unsatisfiable if every worker ran out of subproblems
+    statuses = {message[0] for message in messages}
+    winner = next((message for message in messages if message[0] == 'solved'), None)
+    if stats is not None:
+        stats.update(subproblems=len(subproblems), workers=len(processes), nodes=sum(message[4] for message in messages))
+        if winner is not None:
+            stats.update(status='solved', subproblem=subproblems[winner[2]][0])
+        elif statuses <= {'unsatisfiable'} and len(messages) == len(processes):
+            stats['status'] = 'unsatisfiable'
+        elif any(status.startswith('error') for status in statuses):
+            stats.update(status='error', error=sorted(statuses)[0])
+        else:
+            stats.update(status='budget exceeded', exceeded='seconds')
+
+    if winner is None:
+        return None, [], [], [], {name: [] for name in variables}, {name: 0 for name in variables}
+    return winner[3]
@@ -0,0 +1,306 @@
+import heapq
+from sudoku_constraints import NOT_EQUAL, sudoku_size, sudoku_units
+from sudoku_csp import luby, network_for
+from sudoku_domains import ListDomains
+
+# A CSP as a SAT problem, solved with conflict-driven clause learning (CDCL). Each value left in each domain
+# gets a boolean variable that's true when the cell takes that value. Literals are ints: 2v is variable v
+# and 2v + 1 its negation, so a literal is negated with lit ^ 1 and its variable is lit >> 1.
+
+# Conflicts before the first restart. Later restarts wait for this times the next term of the Luby sequence.
+RESTART_BASE = 100
+
+# How much older conflicts count for against newer ones, when choosing a variable to decide (VSIDS)
+ACTIVITY_DECAY = 0.95
+
+class CDCLSolver:
+    """ A CDCL SAT solver with two watched literals per clause, first-UIP learning, VSIDS and Luby restarts. """
+
+    def __init__(self, num_vars):
+        self.num_vars = num_vars
+        self.ok = True
+
+        # Each clause is a list whose first two literals are watched, listed under the literals they watch
+        self.clauses = []
+        self.learned = []
+        self.watches = [[] for _ in range(2 * num_vars)]
+
+        # 1 if a literal is true, -1 if false and 0 if unassigned, with the level and clause that implied each variable
+        self.values = [0] * (2 * num_vars)
+        self.level = [0] * num_vars
+        self.reason = [None] * num_vars
+
+        # The assigned literals in order, where each decision level starts, and how far propagation has got
+        self.trail = []
+        self.trail_lim = []
+        self.head = 0
+
+        # Variables are decided by activity, taken from a heap whose stale entries are skipped, in their last polarity
+        self.activity = [0.0] * num_vars
+        self.increment = 1.0
+        self.heap = [(0.0, v) for v in range(num_vars)]
+        self.phase = [0] * num_vars
+
+        self.conflicts = self.decisions = self.propagations = self.restarts = 0
+
+    def add_clause(self, literals):
+        """ Add a clause before solving. An empty clause, or a unit clause that contradicts another, makes it unsatisfiable. """
+        # Drop repeated literals and clauses that always hold
+        literals = list(dict.fromkeys(literals))
+        if any(lit ^ 1 in literals for lit in literals):
+            return
+
+        if not literals:
+            self.ok = False
+        elif len(literals) == 1:
+            if self.values[literals[0]] == -1:
+                self.ok = False
+            elif not self.values[literals[0]]:
+                self.enqueue(literals[0], None)
+        else:
+            self.attach(literals)
+            self.clauses.append(literals)
+
+    def attach(self, clause):
+        """ Watch the first two literals of a clause. """
+        self.watches[clause[0]].append(clause)
+        self.watches[clause[1]].append(clause)
+
+    def enqueue(self, lit, reason):
+        """ Make a literal true at the current decision level, implied by the reason clause or decided if it's None. """
+        v = lit >> 1
+        self.values[lit] = 1
+        self.values[lit ^ 1] = -1
+        self.level[v] = len(self.trail_lim)
+        self.reason[v] = reason
+        self.trail.append(lit)
+
+    def propagate(self):
+        """ Make every literal that's the last one left in some clause true, returning a clause that became false, if any. """
+        values, watches, trail = self.values, self.watches, self.trail
+        while self.head < len(trail):
+            false_lit = trail[self.head] ^ 1
+            self.head += 1
+            self.propagations += 1
+
+            # Visit each clause watching the literal that just became false, keeping the ones that still watch it
+            watchers = watches[false_lit]
+            watches[false_lit] = kept = []
+            for index, clause in enumerate(watchers):
+                # Keep the false literal second, so the first is the one the clause could imply
+                if clause[0] == false_lit:
+                    clause[0], clause[1] = clause[1], false_lit
+                first = clause[0]
+                if values[first] == 1:
+                    kept.append(clause)
+                    continue
+
+                # Move the watch to any literal that isn't false
+                for k in range(2, len(clause)):
+                    if values[clause[k]] != -1:
+                        clause[1], clause[k] = clause[k], false_lit
+                        watches[clause[1]].append(clause)
+                        break
+                else:
+                    # Otherwise the first literal has to be true, unless it's already false
+                    kept.append(clause)
+                    if values[first] == -1:
+                        kept.extend(watchers[index + 1:])
+                        return clause
+                    self.enqueue(first, clause)
+        return None
+
+    def analyze(self, conflict):
+        """ Learn a clause from a conflict, cut at the first unique implication point. Returns it and the level to go back to. """
+        level, reason, trail = self.level, self.reason, self.trail
+        current = len(self.trail_lim)
+        seen = set()
+        learned = [None]
+        pending = 0
+        index = len(trail) - 1
+        clause, lit = conflict, None
+
+        while True:
+            # The implied literal is first in its reason, so only the others are what implied it
+            for q in (clause if lit is None else clause[1:]):
+                v = q >> 1
+                if v not in seen and level[v] > 0:
+                    seen.add(v)
+                    self.bump(v)
+                    if level[v] == current:
+                        pending += 1
+                    else:
+                        learned.append(q)
+
+            # Walk back along the trail to the next literal at this level that's part of the conflict
+            while trail[index] >> 1 not in seen:
+                index -= 1
+            lit = trail[index]
+            index -= 1
+            seen.discard(lit >> 1)
+            pending -= 1
+            if not pending:
+                break
+            clause = reason[lit >> 1]
+
+        # The clause makes the negation of the unique implication point true once the search goes back
+        learned[0] = lit ^ 1
+        if len(learned) == 1:
+            return learned, 0
+
+        # Go back to the latest level of the other literals, and watch that literal second
+        second = max(range(1, len(learned)), key = lambda k: level[learned[k] >> 1])
+        learned[1], learned[second] = learned[second], learned[1]
+        return learned, level[learned[1] >> 1]
+
+    def bump(self, v):
+        """ Raise a variable's activity, scaling every activity down before they overflow. """
+        self.activity[v] += self.increment
+        if self.activity[v] > 1e100:
+            self.activity = [activity * 1e-100 for activity in self.activity]
+            self.increment *= 1e-100
+            self.heap = [(-self.activity[u], u) for u in range(self.num_vars) if not self.values[2 * u]]
+            heapq.heapify(self.heap)
+        elif not self.values[2 * v]:
+            heapq.heappush(self.heap, (-self.activity[v], v))
+
+    def cancel_until(self, level):
+        """ Undo every assignment above a decision level, saving each variable's polarity. """
+        if len(self.trail_lim) <= level:
+            return
+
+        for lit in self.trail[self.trail_lim[level]:]:
+            v = lit >> 1
+            self.values[lit] = self.values[lit ^ 1] = 0
+            self.reason[v] = None
+            self.phase[v] = lit & 1
+            heapq.heappush(self.heap, (-self.activity[v], v))
+
+        del self.trail[self.trail_lim[level]:]
+        del self.trail_lim[level:]
+        self.head = len(self.trail)
+
+    def decide(self):
+        """ Get the literal to decide next, for the most active unassigned variable, or None if all are assigned. """
+        while self.heap:
+            _, v = heapq.heappop(self.heap)
+            if not self.values[2 * v]:
+                return 2 * v + self.phase[v]
+        return None
+
+    def solve(self):
+        """ Search for a satisfying assignment, returning whether there is one. """
+        if not self.ok or self.propagate() is not None:
+            return False
+
+        while True:
+            # Restart after a number of conflicts that follows the Luby sequence
+            limit = luby(self.restarts) * RESTART_BASE
+            conflicts = 0
+            while True:
+                conflict = self.propagate()
+                if conflict is not None:
+                    self.conflicts += 1
+                    conflicts += 1
+                    if not self.trail_lim:
+                        return False
+
+                    # Go back to where the learned clause implies its first literal, and imply it
+                    learned, level = self.analyze(conflict)
+                    self.cancel_until(level)
+                    if len(learned) == 1:
+                        self.enqueue(learned[0], None)
+                    else:
+                        self.attach(learned)
+                        self.learned.append(learned)
+                        self.enqueue(learned[0], learned)
+                    self.increment /= ACTIVITY_DECAY
+
+                elif conflicts >= limit:
+                    self.restarts += 1
+                    self.cancel_until(0)
+                    break
+
+                else:
+                    lit = self.decide()
+                    if lit is None:
+                        return True
+                    self.decisions += 1
+                    self.trail_lim.append(len(self.trail))
+                    self.enqueue(lit, None)
+
+    def model(self, v):
+        """ Get whether a variable is true in the satisfying assignment. """
+        return self.values[2 * v] == 1
+
+def encode(csp):
+    """ Encode a CSP as CNF, returning the clauses and the (variable name, value) that each boolean stands for. """
+    variables, constraints = csp
+    names = tuple(variables)
+    choices = []
+    literal = [{} for _ in names]
+    for i, domain in enumerate(variables.values()):
+        for value in domain:
+            literal[i][value] = 2 * len(choices)
+            choices.append((names[i], value))
+
+    # Each cell takes exactly one of its values
+    clauses = []
+    for values in literal:
+        lits = list(values.values())
+        clauses.append(lits)
+        clauses += [[a ^ 1, b ^ 1] for k, a in enumerate(lits) for b in lits[k + 1:]]
+
+    # A not-equal arc rules out each shared value once. Otherwise each value needs one of its supports in the other cell.
+    network = network_for(constraints, names)
+    for (i, j), allowed in zip(network.arcs, network.supports(ListDomains)):
+        if allowed is NOT_EQUAL:
+            if i < j:
+                clauses += [[lit ^ 1, literal[j][value] ^ 1] for value, lit in literal[i].items() if value in literal[j]]
+        else:
+            for x, lit in literal[i].items():
+                clauses.append([lit ^ 1] + [literal[j][y] for y in literal[j] if (x, y) in allowed])
+
+    # On a Sudoku board, every value also has to appear somewhere in each row, column and box
+    size = sudoku_size(csp)
+    if size is not None:
+        for unit in sudoku_units(size):
+            for value in range(1, size + 1):
+                clauses.append([literal[cell][value] for cell in unit if value in literal[cell]])
+
+    return clauses, choices
+
+def sat_search(csp, stats=None):
+    """ Solve a CSP with the CDCL solver, returning the same results as backtracking_search.
+
+    Clauses are learned rather than values tried one at a time, so no failures are recorded. The progress holds
+    each decision that gave a cell its value and the order of assignment is the order cells got their values,
+    both as they stand in the final assignment. If a stats dict is given, the solver's counts are added to it.
+    """
+    variables = csp[0]
+    clauses, choices = encode(csp)
+    solver = CDCLSolver(len(choices))
+    for clause in clauses:
+        solver.add_clause(clause)
+    satisfiable = solver.solve()
+
+    if stats is not None:
+        for key in ('conflicts', 'decisions', 'propagations', 'restarts'):
+            stats[key] = stats.get(key, 0) + getattr(solver, key)
+        stats['learned_clauses'] = stats.get('learned_clauses', 0) + len(solver.learned)
+
+    failed_values = {name: [] for name in variables}
+    backtracks = {name: 0 for name in variables}
+    if not satisfiable:
+        return None, [], [], [], failed_values, backtracks
+
+    # Read each cell's value off the true literals on the trail, in the order they were made true
+    solution, progress = {}, []
+    for lit in solver.trail:
+        if not lit & 1:
+            name, value = choices[lit >> 1]
+            solution[name] = value
+            if solver.reason[lit >> 1] is None and solver.level[lit >> 1]:
+                progress.append((name, value, len(progress) + 1))
+
+    return solution, progress, list(solution), [], failed_values, backtracks